@@ -0,0 +1,1107 @@
+import os
+import re
+import sys
+import time
+import json
+import signal
+import hashlib
+import asyncio
+import threading
+import atexit
+import smtplib
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from email.message import EmailMessage
+from datetime import datetime, date
+from urllib.parse import urlsplit, parse_qsl
+from dotenv import load_dotenv
+import ctypes  # Windows popup
+import httpx
+from pathlib import Path
+from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeout, Error as PlaywrightError
+
+# --------------- Env ---------------
+load_dotenv()
+EMAIL_ADDRESS = os.getenv("EMAIL_ADDRESS")
+EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD")
+
+# --------------- Config ---------------
+HEADLESS_MODE = True          # Set False to watch it interact locally
+STEP_TIMEOUT = 20000          # ms per UI step
+FAST_STEP_TIMEOUT = 2500      # ms for a step's non-final locator variants
+FAST_FLOW_WAIT_MS = 8000      # ms the in-page flow waits for each step's button
+NAV_TIMEOUT = 30000           # ms for the initial navigation to commit
+SLOTS_WAIT_MS = 40000         # wait up to 40s for real time slots to appear
+NO_SLOTS_WAIT_MS = 30000      # wait up to 30s for the explicit "no slots" UI
+POLL_START_MS = 300           # first detection poll interval, grows x1.5 per poll...
+POLL_MAX_MS = 2000            # ...up to this cap
+START_STAGGER_S = 0.1         # delay between target starts (no synchronized bursts at Doctolib)
+MAX_CONCURRENT_TARGETS = 8    # open contexts/pages at once; the rest wait their turn
+CI = os.getenv("GITHUB_ACTIONS") == "true"
+# Not needed to detect slots. Stylesheets stay: visibility checks rely on computed styles
+BLOCK_TYPES = {"image", "font", "media"}
+BLOCK_HOSTS = ("datadoghq", "google-analytics", "googletagmanager", "hotjar", "doubleclick", "facebook")
+# Cookies/localStorage reused across runs (skips the cookie banner); refreshed when stale
+STATE_PATH = Path(os.getenv("STATE_PATH", ".state.json"))
+STATE_MAX_AGE_DAYS = 3
+CONSENT_COOKIE = "didomi_token"
+# Doctolib's JS/CSS bundles are served from disk across runs (kept in actions/cache on CI)
+WEB_CACHE_DIR = Path(os.getenv("WEB_CACHE_DIR", ".webcache"))
+WEB_CACHE_TYPES = {"script", "stylesheet"}
+WEB_CACHE_MAX_AGE_DAYS = 7
+# Only immutable responses are cached: Cache-Control "immutable", or a content hash in the file name
+HASHED_ASSET_RE = re.compile(r"[.-][0-9a-f]{8,}(?:\.chunk)?\.(?:m?js|css)$", re.I)
+# Describe the original encoded transfer; the stored body is already decoded
+WEB_CACHE_DROP_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "set-cookie"}
+# Reuse a conclusive result for CACHE_TTL seconds (retries / overlapping runs); 0 disables
+CACHE_TTL = float(os.getenv("CACHE_TTL", "0"))
+RESULT_CACHE_PATH = Path(os.getenv("RESULT_CACHE_PATH", ".result_cache.json"))
+# Availabilities endpoint + ids discovered per target by a browser run; polled over plain HTTP
+# first, with the browser as fallback and as re-discovery once the entry is this old
+CLINIC_CONFIG_PATH = Path(os.getenv("CLINIC_CONFIG_PATH", "clinic_config.json"))
+DISCOVERY_MAX_AGE_DAYS = 90
+# The flow's final URL, recorded the same way, replaces the steps it encodes; a full walk
+# re-validates it monthly
+DEEP_LINK_MAX_AGE_DAYS = 30
+PROBE_TIMEOUT_S = 10
+# >0: stay up, keep one persistent browser profile warm and poll every POLL_INTERVAL_S seconds
+POLL_INTERVAL_S = float(os.getenv("POLL_INTERVAL_S", "0"))
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", ".pwprofile"))
+# Directory for debug artifacts (uploaded in GH Actions)
+ART_DIR = Path(os.getenv("ARTIFACT_DIR", "artifacts"))
+
+ALERT_SUBJECT = "🚨 Doctolib: appointment signal"
+SMTP_MAX_REUSE = 100          # messages per SMTP session before reconnecting
+# Notify on state changes; a repeated state re-notifies after the cooldown, at most N per hour
+NOTIFY_STATE_PATH = Path(os.getenv("NOTIFY_STATE_PATH", ".notify_state.json"))
+NOTIFY_COOLDOWN_S = float(os.getenv("NOTIFY_COOLDOWN_S", "1800"))
+NOTIFY_MAX_PER_HOUR = 2
+
+# Lean Chromium: no GPU, background services, extensions or unused features.
+# /dev/shm is only 64MB on Actions runners, so Chromium must use /tmp instead.
+# The sandbox stays on outside CI: launches pass chromium_sandbox=not CI, since Playwright
+# adds --no-sandbox itself whenever chromium_sandbox is false.
+LAUNCH_ARGS = [
+    "--disable-gpu",
+    "--disable-dev-shm-usage",
+    "--disable-extensions",
+    "--disable-background-networking",
+    # Concurrent targets are background tabs: keep their timers and rendering at full speed
+    "--disable-background-timer-throttling",
+    "--disable-renderer-backgrounding",
+    "--disable-sync",
+    "--disable-default-apps",
+    "--disable-translate",
+    "--mute-audio",
+    "--hide-scrollbars",
+    "--disable-features=Translate,BackForwardCache,AcceptCHFrame,MediaRouter,OptimizationHints",
+]
+
+CONTEXT_OPTIONS = dict(
+    viewport={"width": 1366, "height": 860},
+    user_agent=("Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+                "AppleWebKit/537.36 (KHTML, like Gecko) "
+                "Chrome/124.0.0.0 Safari/537.36"),
+    locale="fr-FR",
+    timezone_id="Europe/Paris",
+    # Requests a service worker serves never reach context.route (blocking + web cache)
+    service_workers="block",
+)
+
+# --------------- Patterns ---------------
+# Compiled once at import: the detection loop runs these on every poll
+TIME_RE = re.compile(r"\b(?:[01]?\d|2[0-3]):[0-5]\d\b")
+NO_SLOTS_BTN_RE = re.compile(r"cherch(?:er)?\s+un\s+autre\s+(?:soignant|professionnel|praticien)", re.I)
+NOT_AVAILABLE_RE = re.compile(r"n'est malheureusement pas disponible", re.I)
+# Steps shared by every booking flow
+ACCEPT_COOKIES_RE = re.compile("tout accepter|accepter|j'accepte|ok", re.I)
+PRENDRE_RDV_RE = re.compile("Prendre rendez-vous", re.I)
+NO_PREFERENCE_RE = re.compile(r"Je n'?ai pas de préférence", re.I)
+
+# Doctolib slot buttons in serialized HTML; group 1 is the button's inner markup
+SLOT_BUTTON_HTML_RE = re.compile(r"<button\b[^>]*\bdl-button-slot\b[^>]*>(.*?)</button>", re.S)
+# Slot buttons first, then any clickable; the JS keeps rendered ones and returns their text
+SLOT_CANDIDATES_SELECTOR = "button.dl-button-slot, button, [role=button], a"
+VISIBLE_TEXTS_JS = (
+    "els => els.filter(e => e.getClientRects().length && getComputedStyle(e).visibility !== 'hidden')"
+    ".map(e => e.innerText || '')"
+)
+# True if a rendered button/link carries the "search another practitioner" call to action,
+# or the rendered text says the practitioner isn't available
+# (built from the compiled patterns above so the JS and Python checks can't drift apart)
+NO_SLOTS_UI_JS = r"""() => {
+    const rendered = e => e.getClientRects().length && getComputedStyle(e).visibility !== 'hidden';
+    const cta = [...document.querySelectorAll('button, a, [role=button], [role=link]')]
+        .some(e => /%s/i.test(e.innerText || '') && rendered(e));
+    return cta || /%s/i.test(document.body ? document.body.innerText : '');
+}""" % (NO_SLOTS_BTN_RE.pattern, NOT_AVAILABLE_RE.pattern)
+# True as soon as the page renders either a slot button or the explicit "no slots" UI;
+# rendered checks only, so script text and hidden templates can't trip it
+DECISIVE_UI_JS = r"""() => {
+    const rendered = e => e.getClientRects().length && getComputedStyle(e).visibility !== 'hidden';
+    return [...document.querySelectorAll('button.dl-button-slot')].some(rendered) || (%s)();
+}""" % NO_SLOTS_UI_JS
+
+# Cheap per-frame change signal: a frame whose rendered text length is unchanged isn't rescanned
+FRAME_FINGERPRINT_JS = "() => document.body ? document.body.innerText.length : -1"
+# Only these frames can hold the booking widget (ads, reCAPTCHA, Stripe... are skipped)
+BOOKING_FRAME_HOST = "doctolib.fr"
+
+# Clicks through (selector, pattern, flags) steps in-page, one call for the whole flow.
+# Per step: wait for a rendered element of the step's role whose name (aria-label or text)
+# matches, taking the innermost match so a wrapping container never wins; click it; and
+# count the step only once its own view change is seen (the element detached or hidden,
+# or the URL changed). Returns how many steps were confirmed; the URL each clicked step
+# started from and the confirmed count are kept in sessionStorage, which survives a
+# navigation that destroys this call.
+FAST_FLOW_JS = r"""async ([steps, start, waitMs]) => {
+    const rendered = e => e.isConnected && e.getClientRects().length
+        && getComputedStyle(e).visibility !== 'hidden';
+    const name = e => (e.getAttribute('aria-label') || e.innerText || '').trim();
+    const find = (selector, re) => {
+        const hits = [...document.querySelectorAll(selector)].filter(e => rendered(e) && re.test(name(e)));
+        return hits.find(e => !hits.some(o => o !== e && e.contains(o)));
+    };
+    const mutation = ms => new Promise(resolve => {
+        const done = () => { observer.disconnect(); clearTimeout(timer); resolve(); };
+        const observer = new MutationObserver(done);
+        observer.observe(document.documentElement, {childList: true, subtree: true, attributes: true});
+        const timer = setTimeout(done, ms);
+    });
+    for (let i = start; i < steps.length; i++) {
+        const [selector, source, flags] = steps[i];
+        const re = new RegExp(source, flags);
+        let deadline = Date.now() + waitMs;
+        let el = find(selector, re);
+        while (!el && Date.now() < deadline) {
+            await mutation(deadline - Date.now());
+            el = find(selector, re);
+        }
+        if (!el) return i;
+        const before = location.href;
+        const urls = JSON.parse(sessionStorage.getItem('doctocheck-flow-urls') || '[]');
+        urls[i] = before;
+        sessionStorage.setItem('doctocheck-flow-urls', JSON.stringify(urls));
+        el.click();
+        deadline = Date.now() + waitMs;
+        while (rendered(el) && location.href === before && Date.now() < deadline) {
+            await mutation(deadline - Date.now());
+        }
+        if (rendered(el) && location.href === before) return i;  // no view change: not done
+        sessionStorage.setItem('doctocheck-flow-step', String(i + 1));
+    }
+    return steps.length;
+}"""
+# After a navigation killed FAST_FLOW_JS: the clicked step counts if the URL moved on
+FLOW_PROGRESS_JS = r"""() => {
+    const step = Number(sessionStorage.getItem('doctocheck-flow-step') || 0);
+    const urls = JSON.parse(sessionStorage.getItem('doctocheck-flow-urls') || '[]');
+    const clicked = urls.length - 1;
+    return clicked >= step && urls[clicked] !== location.href ? clicked + 1 : step;
+}"""
+FLOW_URLS_JS = "() => JSON.parse(sessionStorage.getItem('doctocheck-flow-urls') || '[]')"
+# Role of a step's in-page match → the elements that can carry it
+FLOW_ROLE_SELECTORS = {
+    "button": "button, [role=button]",
+    "link": "a[href], [role=link]",
+}
+
+# --------------- Flows ---------------
+# A flow is a module-level tuple of (description, variants[, (role, name pattern)]) steps,
+# built once at import; a variant is a selector string or a callable building a Locator
+# from the page. When every step has a (role, pattern) the flow is first run in-page
+# (FAST_FLOW_JS); role is a FLOW_ROLE_SELECTORS key.
+COOKIE_VARIANTS = (
+    lambda page: page.get_by_role("button", name=ACCEPT_COOKIES_RE),
+    "button:has-text('Accepter')",
+    "button:has-text('TOUT ACCEPTER')",
+)
+
+# --------------- Notifications ---------------
+def send_email_notification(message_text: str, subject=ALERT_SUBJECT):
+    global _smtp_sent
+    if not EMAIL_ADDRESS or not EMAIL_PASSWORD:
+        print("⚠️ EMAIL_ADDRESS/EMAIL_PASSWORD not set; skipping email.")
+        return
+    msg = EmailMessage()
+    msg["Subject"] = subject
+    msg["From"] = EMAIL_ADDRESS
+    msg["To"] = EMAIL_ADDRESS
+    msg.set_content(message_text)
+    # Connecting/logging in stays outside the retry: bad credentials fail once, not twice
+    smtp = _get_smtp()
+    try:
+        smtp.send_message(msg)
+    except (smtplib.SMTPServerDisconnected, smtplib.SMTPResponseException):
+        # Dropped or refused (e.g. session expired server-side): one retry on a new session
+        _close_smtp()
+        _get_smtp().send_message(msg)
+    _smtp_sent += 1
+
+# One logged-in SMTP session reused across alerts (only ever touched from the mailer thread)
+_smtp = None
+_smtp_sent = 0
+
+def _close_smtp():
+    global _smtp
+    if _smtp is not None:
+        try:
+            _smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+        _smtp = None
+
+def _get_smtp():
+    """Live SMTP session: reconnects if the NOOP check fails or after SMTP_MAX_REUSE messages."""
+    global _smtp, _smtp_sent
+    if _smtp is not None:
+        try:
+            healthy = _smtp_sent < SMTP_MAX_REUSE and _smtp.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            healthy = False
+        if not healthy:
+            _close_smtp()
+    if _smtp is None:
+        smtp = smtplib.SMTP_SSL("smtp.gmail.com", 465)
+        try:
+            smtp.login(EMAIL_ADDRESS, EMAIL_PASSWORD)
+        except Exception:
+            smtp.close()
+            raise
+        # Cached only once authenticated, so a failed login is retried on the next send
+        _smtp, _smtp_sent = smtp, 0
+    return _smtp
+
+atexit.register(_close_smtp)
+
+# SMTP runs on a worker thread so browser teardown doesn't wait on the mail server
+_mailer = ThreadPoolExecutor(max_workers=1)
+_outbox = []
+
+def queue_email(message_text: str, subject=ALERT_SUBJECT):
+    _outbox.append(_mailer.submit(send_email_notification, message_text, subject))
+
+def flush_emails():
+    """Block until every queued email is sent; re-raises the first send error."""
+    pending, _outbox[:] = list(_outbox), []
+    errors = []
+    for future in pending:
+        try:
+            future.result()
+        except Exception as e:
+            errors.append(e)
+    if errors:
+        raise errors[0]
+
+def should_notify(url, state, alerting=True):
+    """
+    Record `state` as the latest for url and say whether to notify about it: on a state
+    change or once NOTIFY_COOLDOWN_S has passed, within NOTIFY_MAX_PER_HOUR per target
+    (a change to "available" always gets through). A capped change isn't recorded, so it
+    is retried later. alerting=False only records the state (nothing would be sent anyway).
+    """
+    try:
+        log = json.loads(NOTIFY_STATE_PATH.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        log = {}
+    entry = log.get(url, {})
+    now = time.time()
+    sent = [t for t in entry.get("sent", []) if now - t < 3600]
+    last = entry.get("last", 0)
+    changed = state != entry.get("state")
+    notify = alerting and (changed or now - last > NOTIFY_COOLDOWN_S)
+    if notify and len(sent) >= NOTIFY_MAX_PER_HOUR and not (changed and state == "available"):
+        # Capped: keep the previous state so the change is retried on a later poll
+        return False
+    if notify:
+        sent.append(now)
+        last = now
+    log[url] = {"state": state, "last": last, "sent": sent}
+    try:
+        tmp = NOTIFY_STATE_PATH.with_suffix(".tmp")
+        tmp.write_text(json.dumps(log), encoding="utf-8")
+        tmp.replace(NOTIFY_STATE_PATH)
+    except OSError as e:
+        print(f"⚠️ Could not save notification state: {e}")
+    return notify
+
+def _message_box(title, message):
+    try:
+        # MB_ICONINFORMATION | MB_SYSTEMMODAL: on top of other windows
+        ctypes.windll.user32.MessageBoxW(0, message, title, 0x40 | 0x1000)
+    except Exception:
+        pass
+
+def show_popup(title, message):
+    """Open the message box on its own thread so polling goes on while it is shown."""
+    # Not a daemon: a one-shot run keeps the box up until dismissed instead of killing it at exit
+    threading.Thread(target=_message_box, args=(title, message)).start()
+
+# --------------- Network ---------------
+async def block_heavy_resources(route):
+    """
+    Route handler: abort images/fonts/media and third-party trackers, serve scripts and
+    stylesheets from the on-disk web cache, let the rest through.
+    """
+    request = route.request
+    if request.resource_type in BLOCK_TYPES or any(host in request.url for host in BLOCK_HOSTS):
+        await route.abort()
+    elif request.resource_type in WEB_CACHE_TYPES and request.method == "GET":
+        await serve_cached_asset(route)
+    else:
+        await route.continue_()
+
+def is_immutable_asset(url, headers):
+    cache_control = headers.get("cache-control", "").lower()
+    if "no-store" in cache_control or "no-cache" in cache_control:
+        return False
+    return "immutable" in cache_control or bool(HASHED_ASSET_RE.search(urlsplit(url).path))
+
+async def serve_cached_asset(route):
+    """
+    Fulfill from WEB_CACHE_DIR (keyed by URL hash) with the stored body and response headers
+    (CORS included) when fresh, else fetch it and store it if it is immutable.
+    """
+    request = route.request
+    path = WEB_CACHE_DIR / hashlib.sha1(request.url.encode()).hexdigest()
+    meta = path.with_suffix(".json")
+    try:
+        if time.time() - path.stat().st_mtime < WEB_CACHE_MAX_AGE_DAYS * 86400:
+            stored = json.loads(meta.read_text(encoding="utf-8"))
+            await route.fulfill(status=stored["status"], headers=stored["headers"], body=path.read_bytes())
+            return
+    except (OSError, ValueError, KeyError):
+        pass
+    try:
+        response = await route.fetch()
+    except PlaywrightError:
+        await route.continue_()
+        return
+    if response.status == 200 and is_immutable_asset(request.url, response.headers):
+        headers = {k: v for k, v in response.headers.items() if k.lower() not in WEB_CACHE_DROP_HEADERS}
+        try:
+            WEB_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            # Headers first: a body only becomes servable once its metadata exists
+            tmp = path.with_name(f"{path.name}.{id(route):x}.tmp")
+            tmp.write_text(json.dumps({"status": response.status, "headers": headers}), encoding="utf-8")
+            tmp.replace(meta)
+            tmp.write_bytes(await response.body())
+            tmp.replace(path)
+        except (OSError, PlaywrightError):
+            pass
+    await route.fulfill(response=response)
+
+# --------------- Browser state ---------------
+def fresh_storage_state():
+    """Path of the saved storage state if it's recent and readable, else None (cold context)."""
+    try:
+        if time.time() - STATE_PATH.stat().st_mtime > STATE_MAX_AGE_DAYS * 86400:
+            return None
+        json.loads(STATE_PATH.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    return str(STATE_PATH)
+
+async def save_storage_state(context):
+    """Write the context's state to a private temp file and swap it in (targets save concurrently)."""
+    tmp = STATE_PATH.with_name(f"{STATE_PATH.name}.{id(context):x}.tmp")
+    try:
+        await context.storage_state(path=str(tmp))
+        tmp.replace(STATE_PATH)
+    except Exception as e:
+        tmp.unlink(missing_ok=True)
+        print(f"⚠️ Could not save browser state: {e}")
+
+async def has_cookie_consent(context):
+    """True if the context already carries Doctolib's cookie-consent cookie."""
+    return any(c["name"] == CONSENT_COOKIE for c in await context.cookies())
+
+# --------------- Click helpers ---------------
+async def click_first_visible(page, locator, desc, timeout=STEP_TIMEOUT):
+    """Clicks the first visible element for the given locator (Locator or string)."""
+    loc = page.locator(locator) if isinstance(locator, str) else locator
+    await loc.first.wait_for(state="visible", timeout=timeout)
+    await loc.first.scroll_into_view_if_needed(timeout=timeout)
+    await loc.first.click(timeout=timeout)
+    print(f"✅ Clicked: {desc}")
+
+async def try_click_variants(page, desc, variants, timeout=STEP_TIMEOUT, fast_timeout=FAST_STEP_TIMEOUT):
+    """
+    Try multiple locator strategies until one works. Every variant but the last gets
+    fast_timeout, so a wrong primary locator doesn't hold up the fallbacks; the last
+    one keeps the full budget.
+    """
+    last_err = None
+    for i, variant in enumerate(variants, 1):
+        if callable(variant):
+            variant = variant(page)
+        budget = timeout if i == len(variants) else min(fast_timeout, timeout)
+        try:
+            await click_first_visible(page, variant, f"{desc} (variant {i})", timeout=budget)
+            return True
+        except (PlaywrightTimeout, PlaywrightError) as e:
+            last_err = e
+    print(f"⚠️ Could not click {desc}: {last_err}")
+    return False
+
+async def run_flow_in_page(page, flow):
+    """
+    Click through the flow with FAST_FLOW_JS and return (steps completed, URL each of
+    them started from); the Python variants take over from there, including any step
+    the walk clicked without seeing its view change. (0, []) if any step lacks a
+    (role, pattern).
+    """
+    if not all(len(step) > 2 for step in flow):
+        return 0, []
+    steps = [(FLOW_ROLE_SELECTORS[role], name.pattern, "i" if name.flags & re.I else "")
+             for role, name in (step[2] for step in flow)]
+    done = 0
+    while done < len(steps):
+        try:
+            # Stops early when a step's element never shows up or its click changes nothing:
+            # the locator variants take it
+            done = await page.evaluate(FAST_FLOW_JS, [steps, done, FAST_FLOW_WAIT_MS])
+            break
+        except PlaywrightError:
+            # A click navigated away mid-call: resume from the progress the new document kept
+            try:
+                await page.wait_for_load_state("domcontentloaded", timeout=NAV_TIMEOUT)
+                reached = await page.evaluate(FLOW_PROGRESS_JS)
+            except PlaywrightError:
+                break
+            if reached <= done:
+                break
+            done = reached
+    if not done:
+        return 0, []
+    print(f"⚡ In-page flow: {done}/{len(steps)} steps")
+    try:
+        step_urls = (await page.evaluate(FLOW_URLS_JS))[:done]
+    except PlaywrightError:
+        step_urls = []
+    return done, step_urls
+
+# --------------- Detection helpers ---------------
+async def find_slot_times_in_frame(frame):
+    """Return a sorted list of visible time labels (HH:MM) within this frame."""
+    try:
+        html = await frame.content()
+    except Exception:
+        return []
+    # Fast path: Doctolib slot buttons, matched straight in the serialized HTML. Scanning
+    # only their markup keeps opening hours and inline JSON from producing false times.
+    if "dl-button-slot" in html:
+        times = {t for body in SLOT_BUTTON_HTML_RE.findall(html) for t in TIME_RE.findall(body)}
+        if times:
+            return sorted(times)
+
+    # Fallback for other markups: one round-trip, visibility filtering done in the page
+    try:
+        texts = await frame.eval_on_selector_all(SLOT_CANDIDATES_SELECTOR, VISIBLE_TEXTS_JS)
+    except Exception:
+        return []
+    times = {m.group(0) for txt in texts if ":" in txt for m in TIME_RE.finditer(txt)}
+    return sorted(times)
+
+async def any_no_slots_ui_in_frame(frame):
+    """Detect explicit 'no slots' UI in this frame."""
+    try:
+        # Call-to-action and message checks fused into one round-trip; only a boolean comes back
+        return await frame.evaluate(NO_SLOTS_UI_JS)
+    except PlaywrightError:
+        return False
+
+def watch_frames(page):
+    """
+    Return a callable listing the page's Doctolib frames. The list is computed once and
+    rebuilt only after a frame is attached, detached or navigated.
+    """
+    cache = {}
+
+    def invalidate(_frame):
+        cache.pop("frames", None)
+
+    def frames():
+        if "frames" not in cache:
+            cache["frames"] = [fr for fr in page.frames
+                               if fr is page.main_frame or BOOKING_FRAME_HOST in (fr.url or "")]
+        return cache["frames"]
+
+    for event in ("frameattached", "framedetached", "framenavigated"):
+        page.on(event, invalidate)
+    return frames
+
+async def changed_frames(frames, seen):
+    """Yield the frames whose URL or text length changed since they were last yielded."""
+    for fr in frames:
+        try:
+            fingerprint = (fr.url, await fr.evaluate(FRAME_FINGERPRINT_JS))
+        except PlaywrightError:
+            fingerprint = None  # mid-navigation: scan it anyway
+        if fingerprint is not None and seen.get(fr) == fingerprint:
+            continue
+        seen[fr] = fingerprint
+        yield fr
+
+def watch_availabilities(page):
+    """
+    Queue every Doctolib availabilities JSON payload the page receives.
+    Returns (payloads queue, URLs of the responses that were real availabilities payloads,
+    i.e. the ones payload_verdict can read; sibling endpoints are never recorded).
+    """
+    payloads = asyncio.Queue()
+    urls = []
+
+    async def on_response(response):
+        if "availabilities" not in response.url:
+            return
+        try:
+            payload = await response.json()
+        except Exception:
+            return
+        if isinstance(payload, dict) and "availabilities" in payload:
+            urls.append(response.url)
+        payloads.put_nowait(payload)
+
+    page.on("response", on_response)
+    return payloads, urls
+
+def discard_availabilities(payloads, urls):
+    """Drop what watch_availabilities captured so far (e.g. previews from earlier flow steps)."""
+    while not payloads.empty():
+        payloads.get_nowait()
+    urls.clear()
+
+def slot_times_from_payload(payload):
+    """Return sorted HH:MM labels for the slots listed in an availabilities payload."""
+    times = set()
+    for day in payload.get("availabilities") or []:
+        for slot in day.get("slots") or []:
+            # Slots are ISO-8601 strings, or dicts with a start_date on some agendas
+            start = slot.get("start_date") if isinstance(slot, dict) else slot
+            try:
+                times.add(datetime.fromisoformat(start).strftime("%H:%M"))
+            except (TypeError, ValueError):
+                pass
+    return sorted(times)
+
+def payload_verdict(payload):
+    """Return ('available', times) | ('none', []) for one availabilities payload, None if undecided."""
+    if not isinstance(payload, dict) or "availabilities" not in payload:
+        return None
+    times = slot_times_from_payload(payload)
+    if times:
+        return ("available", times)
+    if not payload.get("total") and not payload.get("next_slot"):
+        return ("none", [])
+    return None
+
+def drain_availabilities(payloads):
+    """Consume queued payloads; return ('available', times) | ('none', []) | None if undecided."""
+    verdict = None
+    while True:
+        try:
+            payload = payloads.get_nowait()
+        except asyncio.QueueEmpty:
+            return verdict
+        verdict = payload_verdict(payload) or verdict
+        if verdict and verdict[0] == "available":
+            return verdict
+
+async def wait_for_decisive_ui(page, timeout_ms):
+    """
+    Block until the page shows slots or the 'no slots' UI, or timeout_ms elapses.
+    Playwright re-evaluates the predicate in the page on each animation frame, so we
+    wake up right after the DOM changes instead of on the next fixed poll tick.
+    """
+    try:
+        await page.wait_for_function(DECISIVE_UI_JS, timeout=timeout_ms)
+        return True
+    except PlaywrightTimeout:
+        return False
+    except PlaywrightError:
+        # e.g. execution context destroyed by a navigation: behave like a plain tick
+        await page.wait_for_timeout(timeout_ms)
+        return False
+
+async def scan_for_slots(payloads, frames, scanned):
+    """One slots pass: captured JSON first, then changed frames. Returns a verdict or None."""
+    verdict = drain_availabilities(payloads)
+    if verdict:
+        return verdict
+    async for fr in changed_frames(frames, scanned):
+        times = await find_slot_times_in_frame(fr)
+        if times:
+            return ("available", times)
+    return None
+
+async def scan_for_no_slots(payloads, frames, scanned):
+    """One no-slots pass: captured JSON first, then changed frames. Returns a verdict or None."""
+    verdict = drain_availabilities(payloads)
+    if verdict:
+        return verdict
+    async for fr in changed_frames(frames, scanned):
+        if await any_no_slots_ui_in_frame(fr):
+            return ("none", [])
+    return None
+
+async def detect_availability(page, payloads):
+    """
+    Returns ('available', times) | ('none', []) | ('unknown', [])
+    - AVAILABLE: we saw time labels (HH:MM) in any frame.
+    - NONE: we saw the explicit 'no slots' UI/message.
+    - UNKNOWN: neither appeared within the wait windows (don’t alert).
+    The captured availabilities JSON wins as soon as it lands; DOM scans are the fallback.
+    Polls back off from POLL_START_MS to POLL_MAX_MS, and each window ends with a forced
+    full scan so "unknown" is only returned after a settled check.
+    """
+    frames = watch_frames(page)
+    # No settle wait: the first scan runs now, then each poll races the decisive UI
+    decisive = False
+
+    # 1) Wait up to SLOTS_WAIT_MS for any slot button/time to appear (in page or any frame)
+    deadline = time.monotonic() + (SLOTS_WAIT_MS / 1000.0)
+    interval = POLL_START_MS
+    slots_seen = {}
+    while time.monotonic() < deadline:
+        verdict = await scan_for_slots(payloads, frames(), slots_seen)
+        if verdict:
+            return verdict
+        if decisive:
+            # Decisive UI but no time labels: only a full scan confirming the no-slots UI ends
+            # the window; otherwise keep looking for slots on a plain tick
+            verdict = await scan_for_no_slots(payloads, frames(), {})
+            if verdict:
+                return verdict
+            await page.wait_for_timeout(interval)
+        else:
+            # Wakes early on decisive UI, so backing off costs no reaction time
+            decisive = await wait_for_decisive_ui(page, interval)
+            if decisive:
+                slots_seen = {}  # the view changed: rescan every frame for slots
+        interval = min(interval * 1.5, POLL_MAX_MS)
+    verdict = await scan_for_slots(payloads, frames(), {})
+    if verdict:
+        return verdict
+
+    # 2) If no slots found, wait up to NO_SLOTS_WAIT_MS for an explicit "no slots" UI,
+    # still taking slots that render late
+    deadline = time.monotonic() + (NO_SLOTS_WAIT_MS / 1000.0)
+    interval = POLL_START_MS
+    no_slots_seen = {}
+    while time.monotonic() < deadline:
+        verdict = (await scan_for_slots(payloads, frames(), slots_seen)
+                   or await scan_for_no_slots(payloads, frames(), no_slots_seen))
+        if verdict:
+            return verdict
+        if decisive:
+            await page.wait_for_timeout(interval)  # the race is already won: plain tick
+        else:
+            decisive = await wait_for_decisive_ui(page, interval)
+        interval = min(interval * 1.5, POLL_MAX_MS)
+    verdict = (await scan_for_slots(payloads, frames(), {})
+               or await scan_for_no_slots(payloads, frames(), {}))
+    if verdict:
+        return verdict
+
+    # 3) Neither showed up: unknown (don’t alert)
+    return ("unknown", [])
+
+# --------------- Artifacts ---------------
+async def save_artifacts(page, label="final", full=True):
+    """Viewport JPEG always; HTML and text dumps only when `full` (they're the slow part)."""
+    ART_DIR.mkdir(parents=True, exist_ok=True)
+    try:
+        await page.screenshot(path=str(ART_DIR / f"{label}.jpg"), type="jpeg", quality=60)
+    except Exception:
+        pass
+    if not full:
+        return
+    try:
+        html = await page.content()
+        (ART_DIR / f"{label}.html").write_text(html, encoding="utf-8")
+    except Exception:
+        pass
+    try:
+        # Light text dump (helps search in logs)
+        body_text = await page.locator("body").inner_text(timeout=3000)
+        (ART_DIR / f"{label}.txt").write_text(body_text[:20000], encoding="utf-8")
+    except Exception:
+        pass
+
+# --------------- Result cache ---------------
+def load_result_cache():
+    try:
+        return json.loads(RESULT_CACHE_PATH.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+def store_results(results):
+    """Record {url: (state, times)} with the current timestamp."""
+    cache = load_result_cache()
+    now = time.time()
+    for url, (state, times) in results.items():
+        cache[url] = {"state": state, "times": times, "ts": now}
+    tmp = RESULT_CACHE_PATH.with_suffix(".tmp")
+    tmp.write_text(json.dumps(cache), encoding="utf-8")
+    tmp.replace(RESULT_CACHE_PATH)
+
+def split_cached(targets):
+    """
+    Split targets into ({url: (state, times)} served from cache, targets still to check).
+    Entries past half their TTL are still served, but trigger a background refresh so
+    the next invocation finds a fresh one (lazy renewal).
+    """
+    cache = load_result_cache()
+    cached, todo, renew = {}, [], False
+    for url, flow in targets:
+        entry = cache.get(url)
+        age = time.time() - entry.get("ts", 0) if entry else None
+        if entry and entry.get("state") != "unknown" and age < CACHE_TTL:
+            cached[url] = (entry["state"], entry["times"])
+            renew = renew or age > CACHE_TTL / 2
+        else:
+            todo.append((url, flow))
+    if renew:
+        # Re-run the entry script that called run(), not this module
+        subprocess.Popen(
+            [sys.executable, os.path.abspath(sys.argv[0]), "--refresh"],
+            stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+    return cached, todo
+
+# --------------- API probe ---------------
+def load_clinic_config():
+    try:
+        return json.loads(CLINIC_CONFIG_PATH.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+def remember_availabilities(url, api_url):
+    """Record the availabilities endpoint and query (motive/agenda/practice ids) a browser run saw."""
+    parts = urlsplit(api_url)
+    params = dict(parse_qsl(parts.query, keep_blank_values=True))
+    params.pop("start_date", None)  # set to today on every probe
+    config = load_clinic_config()
+    config.setdefault(url, {}).update(
+        endpoint=parts._replace(query="").geturl(),
+        params=params,
+        discovered=time.time(),
+    )
+    save_clinic_config(config)
+
+def save_clinic_config(config):
+    # Only a cache: failing to write it must never cost a check its result
+    try:
+        tmp = CLINIC_CONFIG_PATH.with_suffix(".tmp")
+        tmp.write_text(json.dumps(config, indent=2, ensure_ascii=False), encoding="utf-8")
+        tmp.replace(CLINIC_CONFIG_PATH)
+    except OSError as e:
+        print(f"⚠️ Could not save clinic config: {e}")
+
+def remember_deep_link(url, step_urls):
+    """
+    step_urls[i] is the page URL before step i, the last entry the URL after the flow.
+    Steps up to the last one that changed the URL are encoded in it; replaying the final
+    URL only needs the steps after that one.
+    """
+    resume = 0
+    for i in range(1, len(step_urls)):
+        if step_urls[i] != step_urls[i - 1]:
+            resume = i
+    if not resume:
+        return
+    config = load_clinic_config()
+    config.setdefault(url, {}).update(deep_link=step_urls[resume], resume_step=resume,
+                                      deep_link_checked=time.time())
+    save_clinic_config(config)
+
+def forget_deep_link(url):
+    config = load_clinic_config()
+    for key in ("deep_link", "resume_step", "deep_link_checked"):
+        config.get(url, {}).pop(key, None)
+    save_clinic_config(config)
+
+def fresh_deep_link(url):
+    """The target's deep-link entry if it was validated within DEEP_LINK_MAX_AGE_DAYS, else None."""
+    entry = load_clinic_config().get(url, {})
+    age = time.time() - entry.get("deep_link_checked", 0)
+    return entry if entry.get("deep_link") and age < DEEP_LINK_MAX_AGE_DAYS * 86400 else None
+
+async def probe_target(client, entry):
+    """GET the availabilities JSON directly; verdict or None (blocked, error, undecided)."""
+    try:
+        response = await client.get(
+            entry["endpoint"], params={**entry["params"], "start_date": date.today().isoformat()},
+        )
+        response.raise_for_status()
+        return payload_verdict(response.json())
+    except (httpx.HTTPError, ValueError):
+        return None
+
+def probe_client():
+    headers = {"User-Agent": CONTEXT_OPTIONS["user_agent"], "Accept": "application/json"}
+    return httpx.AsyncClient(http2=True, headers=headers, timeout=PROBE_TIMEOUT_S, follow_redirects=True)
+
+async def probe_targets(targets, client=None):
+    """
+    Split targets into ({url: (state, times)} settled over HTTP, targets that still need
+    the browser). Only targets with a discovery younger than DISCOVERY_MAX_AGE_DAYS are
+    probed; the others go through the browser, which records them again.
+    Pass a long-lived `client` to keep its connections across polls.
+    """
+    config = load_clinic_config()
+    now = time.time()
+    known = [(url, config[url]) for url, _ in targets
+             if "params" in config.get(url, {})
+             and now - config[url].get("discovered", 0) < DISCOVERY_MAX_AGE_DAYS * 86400]
+    if not known:
+        return {}, targets
+    if client is None:
+        async with probe_client() as client:
+            verdicts = await asyncio.gather(*(probe_target(client, entry) for _, entry in known))
+    else:
+        verdicts = await asyncio.gather(*(probe_target(client, entry) for _, entry in known))
+    probed = {url: verdict for (url, _), verdict in zip(known, verdicts) if verdict}
+    return probed, [(url, flow) for url, flow in targets if url not in probed]
+
+# --------------- Runner ---------------
+async def check_url(context, url, flow, save_debug_artifacts=False):
+    """Run one booking flow in a new page of `context` and return (state, times)."""
+    page = await context.new_page()
+    try:
+        return await check_page(page, context, url, flow, save_debug_artifacts)
+    finally:
+        await page.close()
+
+async def check_page(page, context, url, flow, save_debug_artifacts=False):
+    """Navigate, click through the flow and detect availability on an open page."""
+    # Hook the availabilities XHR before any navigation so we never miss it
+    payloads, api_urls = watch_availabilities(page)
+
+    # A recorded deep link lands past the steps whose choices live in the URL
+    deep = fresh_deep_link(url)
+    start_url, first_step = (deep["deep_link"], deep["resume_step"]) if deep else (url, 0)
+    if deep:
+        print(f"🔗 Deep link skips {first_step}/{len(flow)} steps ({url})")
+        flow = flow[first_step:]
+
+    # "commit" returns as soon as the response starts: the SPA's buttons don't exist at
+    # DOMContentLoaded anyway, and every click step below waits for its own target
+    await page.goto(start_url, wait_until="commit", timeout=NAV_TIMEOUT)
+
+    # Cookie banner (varies a lot on runners; skipped when the saved state already has consent)
+    if not await has_cookie_consent(context):
+        if await try_click_variants(page, "Accept cookies", COOKIE_VARIANTS, timeout=8000):
+            # Persist consent now, even if this run's detection ends up "unknown"
+            await save_storage_state(context)
+
+    # The last step always goes through the locators: only payloads that arrive after its
+    # click count, so an earlier step's preview (e.g. "total: 0") can't pass for the verdict
+    done, step_urls = await run_flow_in_page(page, flow[:-1])
+    for i, (desc, variants, *_) in enumerate(flow):
+        if i < done:
+            continue
+        step_urls.append(page.url)
+        if i == len(flow) - 1:
+            discard_availabilities(payloads, api_urls)
+        # The first step doubles as the app-ready probe after a "commit" navigation: the SPA
+        # may still be hydrating, so its primary locator gets the full budget too
+        await try_click_variants(page, desc, variants, fast_timeout=FAST_STEP_TIMEOUT if i else STEP_TIMEOUT)
+    step_urls.append(page.url)  # where the last step left us
+
+    # --------- Availability detection (3-state) ---------
+    state, times = await detect_availability(page, payloads)
+    if state != "unknown":
+        await save_storage_state(context)
+        if api_urls:
+            # The latest payload is the one the final view (and so the verdict) came from
+            remember_availabilities(url, api_urls[-1])
+        if not deep and len(step_urls) == len(flow) + 1:
+            remember_deep_link(url, step_urls)
+    elif deep:
+        print(f"⚠️ Deep link didn't reach a conclusive page; next run walks the full flow ({url})")
+        forget_deep_link(url)
+    # Evidence only where it helps: none on success, a screenshot for "none", full dump for "unknown"
+    if save_debug_artifacts and state != "available":
+        slug = url.rstrip("/").rsplit("/", 1)[-1]
+        await save_artifacts(page, label=f"{slug}_state_{state}", full=(state == "unknown"))
+    return state, times
+
+async def check_target(context, url, flow, delay, save_debug_artifacts=False, on_result=None):
+    await asyncio.sleep(delay)
+    state, times = await check_url(context, url, flow, save_debug_artifacts)
+    if on_result:
+        # Before teardown, so a queued email goes out while the context/browser close
+        await on_result(url, state, times)
+    return state, times
+
+async def check_target_in_new_context(browser, url, flow, delay, save_debug_artifacts=False, on_result=None):
+    context = await browser.new_context(storage_state=fresh_storage_state(), **CONTEXT_OPTIONS)
+    await context.route("**/*", block_heavy_resources)
+    try:
+        return await check_target(context, url, flow, delay, save_debug_artifacts, on_result)
+    finally:
+        await context.close()
+
+async def report(url, state, times, notify=True, email_subject=ALERT_SUBJECT, show_popups=False):
+    if notify and state != "unknown":
+        alerting = state == "available" or show_popups
+        notify = should_notify(url, state, alerting)
+        if alerting and not notify:
+            print(f"🔕 Already notified about '{state}' recently; staying quiet. ({url})")
+    if state == "available":
+        print(f"✅ Slots found: {times} ({url})")
+        if notify:
+            queue_email(f"Slots found on Doctolib: {', '.join(times)}\n\n{url}", email_subject)
+            if show_popups:
+                show_popup("Doctor Checker", f"Slots: {', '.join(times)}")
+    elif state == "none":
+        print(f"❌ No appointments (explicit UI) ({url}).")
+        if notify and show_popups:
+            show_popup("Doctor Checker", "No appointment available.")
+    else:
+        print(f"🤷 No positive slots and no explicit 'no-slots' UI → UNKNOWN. Not sending email. ({url})")
+
+async def gather_targets(checks):
+    """Run target checks concurrently, at most MAX_CONCURRENT_TARGETS at a time; exceptions are returned."""
+    limit = asyncio.Semaphore(MAX_CONCURRENT_TARGETS)
+
+    async def limited(check):
+        async with limit:
+            return await check
+
+    return await asyncio.gather(*(limited(check) for check in checks), return_exceptions=True)
+
+async def run_targets(targets, save_debug_artifacts=False, on_result=None):
+    """
+    Check (url, flow) targets concurrently under one browser; exceptions are returned, not raised.
+    on_result(url, state, times) is awaited for each target as soon as its check finishes.
+    """
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(
+            headless=HEADLESS_MODE, args=LAUNCH_ARGS, chromium_sandbox=not CI,
+            handle_sigint=False, handle_sigterm=False,
+        )
+        try:
+            return await gather_targets(
+                check_target_in_new_context(browser, url, flow, i * START_STAGGER_S,
+                                            save_debug_artifacts, on_result)
+                for i, (url, flow) in enumerate(targets)
+            )
+        finally:
+            await browser.close()
+
+async def main(targets, email_subject=ALERT_SUBJECT, show_popups=False, save_debug_artifacts=False,
+               refresh=False):
+    """
+    refresh=True is the background cache renewal: skip the cache read. It still notifies,
+    through should_notify like every other result, so a state change it finds isn't lost.
+    """
+    cached = {}
+    if CACHE_TTL > 0 and not refresh:
+        cached, targets = split_cached(targets)
+
+    async def on_result(url, state, times):
+        await report(url, state, times, True, email_subject, show_popups)
+
+    # Targets whose availabilities endpoint answers conclusively never start Chromium
+    probed = {}
+    if targets:
+        probed, targets = await probe_targets(targets)
+    for url, (state, times) in probed.items():
+        print(f"⚡ Settled over the availabilities API: {url}")
+        await on_result(url, state, times)
+
+    results = await run_targets(targets, save_debug_artifacts, on_result) if targets else []
+
+    fresh = dict(probed)
+    fresh.update((url, r) for (url, _), r in zip(targets, results) if not isinstance(r, BaseException))
+    if CACHE_TTL > 0 and fresh:
+        store_results(fresh)
+
+    # should_notify keeps cached results from re-alerting what their producing run already sent
+    for url, (state, times) in cached.items():
+        print(f"♻️ Cached result for {url}")
+        await report(url, state, times, True, email_subject, show_popups)
+
+    errors = []
+    for (url, _), result in zip(targets, results):
+        if isinstance(result, BaseException):
+            print(f"💥 {url}: {result!r}")
+            errors.append(result)
+    if errors:
+        raise errors[0]
+
+async def watch(targets, interval, email_subject=ALERT_SUBJECT, show_popups=False,
+                save_debug_artifacts=False):
+    """
+    Long-running mode: one persistent context (cookies, consent, HTTP cache survive in
+    PROFILE_DIR) and one HTTP client shared by every poll; each target gets a fresh page
+    per poll. SIGTERM lets the current poll finish, then closes everything.
+    """
+    async def on_result(url, state, times):
+        await report(url, state, times, True, email_subject, show_popups)
+
+    stop = asyncio.Event()
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+    except (NotImplementedError, AttributeError):
+        pass  # Windows: no SIGTERM handlers in asyncio; Ctrl+C still stops the loop
+
+    async with async_playwright() as p, probe_client() as client:
+        while not stop.is_set():
+            context = await p.chromium.launch_persistent_context(
+                str(PROFILE_DIR), headless=HEADLESS_MODE, args=LAUNCH_ARGS, chromium_sandbox=not CI,
+                handle_sigint=False, handle_sigterm=False, **CONTEXT_OPTIONS,
+            )
+            # Chromium crashed or the context went away: every poll would just fail, so relaunch.
+            # A relaunch that fails raises out of run() with a non-zero exit.
+            closed = asyncio.Event()
+            context.on("close", lambda _: closed.set())
+            await context.route("**/*", block_heavy_resources)
+            try:
+                while not (stop.is_set() or closed.is_set()):
+                    probed, todo = await probe_targets(targets, client)
+                    for url, (state, times) in probed.items():
+                        await on_result(url, state, times)
+                    results = await gather_targets(
+                        check_target(context, url, flow, i * START_STAGGER_S, save_debug_artifacts, on_result)
+                        for i, (url, flow) in enumerate(todo)
+                    )
+                    for (url, _), result in zip(todo, results):
+                        if isinstance(result, BaseException):
+                            print(f"💥 {url}: {result!r}")
+                    try:
+                        await asyncio.to_thread(flush_emails)
+                    except Exception as e:
+                        print(f"💥 Email failed: {e!r}")
+                    if closed.is_set():
+                        break
+                    print(f"💤 Next poll in {interval:g}s")
+                    waiters = [asyncio.ensure_future(event.wait()) for event in (stop, closed)]
+                    await asyncio.wait(waiters, timeout=interval, return_when=asyncio.FIRST_COMPLETED)
+                    for waiter in waiters:
+                        waiter.cancel()
+            finally:
+                if not closed.is_set():
+                    await context.close()
+            if closed.is_set() and not stop.is_set():
+                print("💥 Browser context closed unexpectedly; relaunching.")
+        print("🛑 SIGTERM received; shutting down.")
+
+def run(targets, email_subject=ALERT_SUBJECT, show_popups=False, save_debug_artifacts=False):
+    """
+    Check every (url, flow) target under a single browser, one context per target, and report.
+    Entry scripts call this from __main__; `--refresh` on their command line marks the
+    background cache renewal. With POLL_INTERVAL_S > 0 it polls forever instead (see watch()).
+    """
+    try:
+        if POLL_INTERVAL_S > 0:
+            asyncio.run(watch(targets, POLL_INTERVAL_S, email_subject, show_popups, save_debug_artifacts))
+        else:
+            asyncio.run(main(targets, email_subject, show_popups, save_debug_artifacts,
+                             refresh="--refresh" in sys.argv[1:]))
+    finally:
+        flush_emails()